@@ -1,8 +1,12 @@
 # backend/auth.py
 
 import os
+import time
+import hashlib
 import jwt
-from datetime import datetime, timedelta
+from jwt.utils import base64url_encode
+from collections import OrderedDict
+from typing import Annotated
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -13,42 +17,161 @@ from .models import User
 
 SECRET_KEY = os.getenv("APP_SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
+TOKEN_LIFETIME = 7 * 24 * 60 * 60  # seconds
+
+# Hoisted so token issue/verify don't rebuild these on every call
+_SECRET = SECRET_KEY.encode()
+# Pre-parsed key: decoding with a PyJWK skips PyJWT's per-call prepare_key
+_VERIFY_KEY = jwt.PyJWK(
+    {"kty": "oct", "k": base64url_encode(_SECRET).decode()},
+    algorithm=ALGORITHM,
+)
+_ALGORITHMS = [ALGORITHM]
+# exp is still required, but checked once in get_current_user for both fresh
+# and cached tokens rather than also inside PyJWT's claim pipeline
+_DECODE_OPTIONS = {
+    "require": ["exp", "sub"],
+    "verify_signature": True,
+    "verify_exp": False,
+    "verify_aud": False,
+    "verify_iss": False,
+}
 
 auth_scheme = HTTPBearer()
 
+# Both caches are keyed by sha256(token) rather than the token itself, so the
+# process never holds bearer credentials and each key is a fixed 32 bytes.
+
+# Decoded tokens: token hash -> (user_id, exp).
+# Only successfully verified tokens are stored, so bad tokens always hit PyJWT.
+TOKEN_CACHE_SIZE = 4096
+_token_cache: "OrderedDict[bytes, tuple[int, int]]" = OrderedDict()
+
+# Authenticated users: token hash -> (detached User, expires_at).
+# Short TTL so profile / refresh-token changes show up quickly.
+USER_CACHE_TTL = 30
+USER_CACHE_SIZE = 10_000
+_user_cache: dict[bytes, tuple[User, float]] = {}
+# Reverse index user_id -> token hashes, so a user's entries can be dropped
+# as soon as their row changes instead of waiting out the TTL.
+_user_cache_keys: dict[int, set[bytes]] = {}
+
 
 def create_app_token(user_id: int) -> str:
     """Generate a JWT signed with PyJWT."""
     payload = {
         "sub": str(user_id),
-        "exp": datetime.utcnow() + timedelta(days=7)
+        "exp": int(time.time()) + TOKEN_LIFETIME
     }
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    token = jwt.encode(payload, _SECRET, algorithm=ALGORITHM)
     return token
 
 
+def _token_key(raw_token: str) -> bytes:
+    """Cache key for a raw bearer token."""
+    return hashlib.sha256(raw_token.encode()).digest()
+
+
+def _decode_cached(raw_token: str, key: bytes) -> tuple[int, int]:
+    """Return (user_id, exp) for a token, decoding it only on a cache miss."""
+    cached = _token_cache.get(key)
+    if cached is not None:
+        _token_cache.move_to_end(key)
+        return cached
+
+    payload = jwt.decode(
+        raw_token,
+        _VERIFY_KEY,
+        algorithms=_ALGORITHMS,
+        options=_DECODE_OPTIONS,
+    )
+    # verify_exp is off, so PyJWT no longer checks that exp is numeric
+    try:
+        decoded = (int(payload["sub"]), int(payload["exp"]))
+    except (KeyError, TypeError, ValueError) as exc:
+        raise jwt.InvalidTokenError("Malformed sub or exp claim") from exc
+
+    _token_cache[key] = decoded
+    if len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+    return decoded
+
+
+def token_expiry(raw_token: str) -> int | None:
+    """Return the exp claim of a validly signed token, or None."""
+    try:
+        return _decode_cached(raw_token, _token_key(raw_token))[1]
+    except jwt.InvalidTokenError:
+        return None
+
+
+def _cache_user(key: bytes, user: User) -> None:
+    _drop_cached_user(key)
+    if len(_user_cache) >= USER_CACHE_SIZE:
+        _drop_cached_user(next(iter(_user_cache)))
+
+    _user_cache[key] = (user, time.monotonic() + USER_CACHE_TTL)
+    _user_cache_keys.setdefault(user.id, set()).add(key)
+
+
+def _drop_cached_user(key: bytes) -> None:
+    entry = _user_cache.pop(key, None)
+    if entry is None:
+        return
+
+    keys = _user_cache_keys.get(entry[0].id)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _user_cache_keys[entry[0].id]
+
+
+def invalidate_user_cache(user_id: int) -> None:
+    """Forget cached User objects for a user, e.g. after their row is updated."""
+    for key in _user_cache_keys.pop(user_id, ()):
+        _user_cache.pop(key, None)
+
+
 async def get_current_user(
         token = Depends(auth_scheme),
         db: AsyncSession = Depends(get_db)
 ):
     """Decode JWT and return the authenticated user."""
     raw_token = token.credentials
+    key = _token_key(raw_token)
 
     try:
-        payload = jwt.decode(raw_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = int(payload["sub"])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired.")
+        user_id, exp = _decode_cached(raw_token, key)
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
+    # PyJWT doesn't check exp (see _DECODE_OPTIONS) and cached tokens skip
+    # PyJWT entirely, so this is the single expiry check
+    if exp <= time.time():
+        _token_cache.pop(key, None)
+        _drop_cached_user(key)
+        raise HTTPException(status_code=401, detail="Token expired.")
+
+    cached = _user_cache.get(key)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
     # Fetch user from DB
     result = await db.execute(
         select(User).where(User.id == user_id)
     )
-    user = result.scalars().first()
+    user = result.scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=401, detail="User not found.")
 
+    # Detach so the cached instance isn't tied to this request's session
+    db.expunge(user)
+    _cache_user(key, user)
+
     return user
+
+
+# Route parameter type for the authenticated user. FastAPI caches dependency
+# results per request, so routes/sub-dependencies sharing it resolve it once.
+CurrentUser = Annotated[User, Depends(get_current_user)]
@@ -1,8 +1,11 @@
 # backend/crud.py
-import json
 
-from sqlalchemy import select
+from sqlalchemy import select, insert, update, lambda_stmt
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, load_only
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from backend.models import User, Room, RoomMember, PreferenceProfile, Playlist
 
@@ -11,45 +14,67 @@ from backend.schemas import (
     PreferencesCreate
 )
 from datetime import datetime
-import random
+import secrets
 import string
 
+ROOM_CODE_ALPHABET = string.ascii_uppercase + string.digits
+ROOM_CODE_BASE = len(ROOM_CODE_ALPHABET)
+ROOM_CODE_ATTEMPTS = 5
+
 
 # ======================================================
 # USERS
 # ======================================================
 
 async def get_user_by_spotify_id(db: AsyncSession, spotify_id: str):
-    """Return a user by their Spotify user ID."""
+    """Return a user by their Spotify user ID.
+
+    Only id and refresh_token are loaded; that's all the auth callback needs.
+    """
+    # lambda_stmt caches the built statement; spotify_id becomes a bound param
     result = await db.execute(
-        select(User).where(User.spotify_id == spotify_id)
+        lambda_stmt(
+            lambda: select(User)
+            .options(load_only(User.id, User.refresh_token))
+            .where(User.spotify_id == spotify_id)
+        )
     )
-    return result.scalars().first()
+    return result.scalar_one_or_none()
 
 
 async def create_user(db: AsyncSession, data: UserCreate) -> User:
     """Create a new user in the database."""
-    user = User(
-        spotify_id=data.spotify_id,
-        display_name=data.display_name,
-        avatar_url=data.avatar_url,
-        refresh_token=data.refresh_token,
+    # INSERT ... RETURNING gives back the full row, so no refresh round trip
+    result = await db.execute(
+        insert(User)
+        .values(
+            spotify_id=data.spotify_id,
+            display_name=data.display_name,
+            avatar_url=data.avatar_url,
+            refresh_token=data.refresh_token,
+        )
+        .returning(User)
     )
-    db.add(user)
+    user = result.scalar_one()
     await db.commit()
-    await db.refresh(user)
     return user
 
 
 async def update_user_refresh_token(db: AsyncSession, spotify_id: str, new_refresh: str):
     """Update a user's refresh token when they re-login."""
-    user = await get_user_by_spotify_id(db, spotify_id)
+    # Single UPDATE ... RETURNING instead of SELECT + UPDATE + refresh
+    result = await db.execute(
+        update(User)
+        .where(User.spotify_id == spotify_id)
+        .values(refresh_token=new_refresh)
+        .returning(User),
+        execution_options={"populate_existing": True}
+    )
+    user = result.scalar_one_or_none()
     if not user:
         return None
 
-    user.refresh_token = new_refresh
     await db.commit()
-    await db.refresh(user)
     return user
 
 
@@ -75,7 +100,7 @@ async def end_room(db: AsyncSession, room_id: int, host_id: int):
     result = await db.execute(
         select(Room).where(Room.id == room_id)
     )
-    room = result.scalars().first()
+    room = result.scalar_one_or_none()
 
     if not room:
         return None, "Room not found"
@@ -110,19 +135,40 @@ async def end_room(db: AsyncSession, room_id: int, host_id: int):
 
 def generate_room_code(length: int = 6) -> str:
     """Generate a random 6-character room code."""
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-
+    # One CSPRNG draw over the whole code space, then base-36 digits;
+    # unbiased, unlike taking raw urandom bytes modulo 36
+    n = secrets.randbelow(ROOM_CODE_BASE ** length)
+    chars = []
+    for _ in range(length):
+        n, digit = divmod(n, ROOM_CODE_BASE)
+        chars.append(ROOM_CODE_ALPHABET[digit])
+    return ''.join(chars)
+
+
+async def create_room(db: AsyncSession, host_user_id: int, commit: bool = True) -> Room:
+    """Create a room hosted by the given user.
+
+    With commit=False the room is only flushed (so room.id is set) and the
+    caller is responsible for committing.
+    """
+    # Rely on the unique index on Room.code; retry with a fresh code on collision
+    for attempt in range(ROOM_CODE_ATTEMPTS):
+        room = Room(
+            code=generate_room_code(),
+            host_user_id=host_user_id,
+            is_active=True
+        )
+        try:
+            async with db.begin_nested():
+                db.add(room)
+            break
+        except IntegrityError:
+            if attempt == ROOM_CODE_ATTEMPTS - 1:
+                raise
 
-async def create_room(db: AsyncSession, host_user_id: int) -> Room:
-    """Create a room hosted by the given user."""
-    code = generate_room_code()
+    if not commit:
+        return room
 
-    room = Room(
-        code=code,
-        host_user_id=host_user_id,
-        is_active=True
-    )
-    db.add(room)
     await db.commit()
     await db.refresh(room)
     return room
@@ -131,17 +177,25 @@ async def create_room(db: AsyncSession, host_user_id: int) -> Room:
 async def get_room_by_code(db: AsyncSession, code: str) -> Room:
     """Fetch a room using its join code."""
     result = await db.execute(
-        select(Room).where(Room.code == code)
+        lambda_stmt(lambda: select(Room).where(Room.code == code))
     )
-    return result.scalars().first()
+    return result.scalar_one_or_none()
 
 
 # ======================================================
 # ROOM MEMBERS
 # ======================================================
 
-async def add_user_to_room(db: AsyncSession, room_id: int, user_id: int) -> RoomMember:
-    """Add a user to a room only if not already joined."""
+async def add_user_to_room(
+        db: AsyncSession,
+        room_id: int,
+        user_id: int,
+        commit: bool = True
+) -> RoomMember:
+    """Add a user to a room only if not already joined.
+
+    With commit=False the membership is only added to the session.
+    """
 
     # Check if user already in this room
     result = await db.execute(
@@ -158,6 +212,9 @@ async def add_user_to_room(db: AsyncSession, room_id: int, user_id: int) -> Room
     # Otherwise create new membership
     member = RoomMember(room_id=room_id, user_id=user_id)
     db.add(member)
+    if not commit:
+        return member
+
     await db.commit()
     await db.refresh(member)
     return member
@@ -166,13 +223,18 @@ async def add_user_to_room(db: AsyncSession, room_id: int, user_id: int) -> Room
 
 async def get_room_members(db: AsyncSession, room_id: int):
     """Return all users in a room."""
+    # Load every member's user in one extra query instead of one per row
     result = await db.execute(
-        select(RoomMember).where(RoomMember.room_id == room_id)
+        select(RoomMember)
+        .options(selectinload(RoomMember.user))
+        .where(RoomMember.room_id == room_id)
     )
     return result.scalars().all()
 
 async def get_room(db: AsyncSession, room_id: int):
-    result = await db.execute(select(Room).where(Room.id == room_id))
+    result = await db.execute(
+        lambda_stmt(lambda: select(Room).where(Room.id == room_id))
+    )
     return result.scalar_one_or_none()
 
 
@@ -189,39 +251,35 @@ async def save_preferences(
 
     """Create or update a preferences profile for a user in a room."""
 
-    # Check if preferences already exist
-    result = await db.execute(
-        select(PreferenceProfile).where(
-            PreferenceProfile.room_id == room_id,
-            PreferenceProfile.user_id == user_id
-        )
-    )
-    existing = result.scalars().first()
+    # Single INSERT ... ON CONFLICT DO UPDATE instead of SELECT + INSERT/UPDATE
+    dialect_insert = pg_insert if db.get_bind().dialect.name == "postgresql" else sqlite_insert
 
-    if existing:
-        # Update existing profile
-        existing.event_type = data.event_type
-        existing.genres = ",".join(data.genres)   # store as CSV string
-        existing.energy_level = data.energy_level
-        existing.new_vs_familiar = data.new_vs_familiar
-        existing.hard_nos = ",".join(data.hard_nos)
-        await db.commit()
-        await db.refresh(existing)
-        return existing
-
-    # Create new profile
-    prefs = PreferenceProfile(
+    stmt = dialect_insert(PreferenceProfile).values(
         room_id=room_id,
         user_id=user_id,
         event_type=data.event_type,
-        genres=json.dumps(data.genres),
+        genres=data.genres,
         energy_level=data.energy_level,
         new_vs_familiar=data.new_vs_familiar,
-        hard_nos=json.dumps(data.hard_nos),
+        hard_nos=data.hard_nos,
     )
-    db.add(prefs)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["room_id", "user_id"],
+        set_={
+            "event_type": stmt.excluded.event_type,
+            "genres": stmt.excluded.genres,
+            "energy_level": stmt.excluded.energy_level,
+            "new_vs_familiar": stmt.excluded.new_vs_familiar,
+            "hard_nos": stmt.excluded.hard_nos,
+        },
+    ).returning(PreferenceProfile)
+
+    result = await db.execute(
+        stmt,
+        execution_options={"populate_existing": True}
+    )
+    prefs = result.scalar_one()
     await db.commit()
-    await db.refresh(prefs)
     return prefs
 
 async def get_preferences_for_room(
@@ -231,11 +289,27 @@ async def get_preferences_for_room(
     """Return all preference profiles for a given room."""
 
     result = await db.execute(
-        select(PreferenceProfile).where(
-            PreferenceProfile.room_id == room_id
+        lambda_stmt(
+            lambda: select(PreferenceProfile).where(
+                PreferenceProfile.room_id == room_id
+            )
         )
     )
     return result.scalars().all()
+
+
+async def has_preferences(db: AsyncSession, room_id: int, user_id: int) -> bool:
+    """Return whether a user has submitted preferences for a room."""
+    # Existence check only, so fetch the id instead of a full ORM object
+    result = await db.execute(
+        lambda_stmt(
+            lambda: select(PreferenceProfile.id).where(
+                PreferenceProfile.room_id == room_id,
+                PreferenceProfile.user_id == user_id
+            )
+        )
+    )
+    return result.scalar() is not None
 # ======================================================
 # PLAYLISTS
 # ======================================================
@@ -2,6 +2,7 @@
 import os
 from dotenv import load_dotenv
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
     async_sessionmaker,
@@ -16,10 +17,36 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in the environment.")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=True,  # shows SQL executed in terminal for debugging
-)
+# SQL logging is opt-in: every echoed statement is a blocking stdout write
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"
+
+engine_kwargs = {
+    "echo": DB_ECHO,  # set DB_ECHO=1 to show SQL executed in terminal for debugging
+    "pool_pre_ping": True,
+}
+
+# SQLite gets SQLAlchemy's default pool; size the pool for server databases
+if not DATABASE_URL.startswith("sqlite"):
+    engine_kwargs.update(
+        pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        pool_recycle=1800,
+    )
+
+engine = create_async_engine(DATABASE_URL, **engine_kwargs)
+
+if DATABASE_URL.startswith("sqlite"):
+    # The sqlite driver only emits BEGIN lazily, so a SAVEPOINT (begin_nested)
+    # could become the outermost transaction and commit on release. Take over
+    # BEGIN ourselves so savepoints always nest inside the session transaction.
+    # https://docs.sqlalchemy.org/en/20/dialects/sqlite.html#serializable-isolation-savepoints-transactional-ddl
+    @event.listens_for(engine.sync_engine, "connect")
+    def _sqlite_disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _sqlite_begin(conn):
+        conn.exec_driver_sql("BEGIN")
 
 AsyncSessionLocal = async_sessionmaker( #creates session which allows me to make changes
     engine,
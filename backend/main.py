@@ -1,7 +1,10 @@
 # backend/main.py
 
-from fastapi import FastAPI, Depends, HTTPException
+import httpx
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import get_db, engine, Base
@@ -13,21 +16,75 @@ from .crud import (
     get_room_by_code,
     add_user_to_room,
     save_preferences,
-    get_room, get_room_members, remove_user_from_room, end_room, get_preferences_for_room
+    get_room, get_room_members, remove_user_from_room, end_room, get_preferences_for_room,
+    has_preferences
 )
-from .models import User
-from .schemas import UserOut, PreferencesCreate, RoomOut, UserCreate
+from .schemas import UserOut, PreferencesCreate, RoomOut, UserCreate, RoomMemberOut
 from . import spotify_auth, playlist_engine
-from .auth import get_current_user
+from .auth import CurrentUser, invalidate_user_cache
 from . import models   # <-- IMPORTANT: ensures SQLAlchemy loads models
-from typing import List
-from sqlalchemy import select
-from .models import PreferenceProfile
+from typing import Annotated, List
 from .schemas import PreferencesOut, VibeProfile
-import json
+import os
+import asyncio
+import itertools
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from .rec_engine import generate_vibe_profile
+from .response_cache import ResponseCacheMiddleware
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Dev convenience; deployments that manage the schema with migrations
+# should set AUTO_CREATE_TABLES=0 to skip the reflection pass on boot.
+AUTO_CREATE_TABLES = os.getenv("AUTO_CREATE_TABLES", "1") == "1"
+
+
+@asynccontextmanager
+async def queued_logging():
+    """Route root log records through a queue so handler I/O runs off the event loop."""
+    root = logging.getLogger()
+    original_handlers = root.handlers[:]
+    log_queue = queue.SimpleQueue()
+
+    listener = QueueListener(
+        log_queue,
+        *(original_handlers or [logging.StreamHandler()]),
+        respect_handler_level=True
+    )
+    root.handlers = [QueueHandler(log_queue)]
+    listener.start()
+    try:
+        yield
+    finally:
+        listener.stop()
+        root.handlers = original_handlers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with queued_logging():
+        # CREATE TABLES ON STARTUP
+        if AUTO_CREATE_TABLES:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+
+        # One pooled client for all Spotify calls
+        app.state.http = httpx.AsyncClient(
+            timeout=spotify_auth.HTTP_TIMEOUT,
+            limits=spotify_auth.HTTP_LIMITS,
+        )
+        yield
+        await app.state.http.aclose()
+
+
+# orjson serializes responses in C instead of the stdlib json encoder
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# /me/app is constant per token, so repeat hits skip routing, auth and
+# serialization entirely. Added before CORS so CORS wraps cached responses too.
+app.add_middleware(ResponseCacheMiddleware, paths=["/me/app"], ttl=15)
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,6 +94,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# async so FastAPI awaits it inline rather than dispatching to the threadpool
+async def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Return the shared Spotify HTTP client created in lifespan."""
+    return request.app.state.http
+
+
+DbSession = Annotated[AsyncSession, Depends(get_db)]
+HttpClient = Annotated[httpx.AsyncClient, Depends(get_http_client)]
+
 # ============================================================
 # AUTH FLOW — UPDATED
 # ============================================================
@@ -49,18 +115,23 @@ async def auth_login():
 
 @app.get("/auth/callback")
 async def auth_callback(
+        db: DbSession,
+        http: HttpClient,
         code: str | None = None,
-        state: str | None = None,
-        db: AsyncSession = Depends(get_db)
+        state: str | None = None
 ):
-    tokens = await spotify_auth.exchange_code_for_token(code)
+    tokens = await spotify_auth.exchange_code_for_token(http, code)
     if "error" in tokens:
+        logger.warning(
+            "Spotify token exchange failed: %s",
+            tokens.get("error_description") or tokens["error"]
+        )
         raise HTTPException(status_code=400, detail="Invalid Spotify callback")
 
     access_token = tokens["access_token"]
     refresh_token = tokens.get("refresh_token")
 
-    profile = await spotify_auth.get_user_profile(access_token)
+    profile = await spotify_auth.get_user_profile(http, access_token)
     spotify_id = profile["id"]
 
     user = await get_user_by_spotify_id(db, spotify_id)
@@ -68,6 +139,8 @@ async def auth_callback(
     if user:
         if refresh_token:
             user = await update_user_refresh_token(db, spotify_id, refresh_token)
+            # Cached copies still hold the old refresh token
+            invalidate_user_cache(user.id)
     else:
         data = {
             "spotify_id": spotify_id,
@@ -82,7 +155,7 @@ async def auth_callback(
 
 
 @app.get("/me/app", response_model=UserOut)
-async def get_me_route(user = Depends(get_current_user)):
+async def get_me_route(user: CurrentUser):
     return user
 
 # ============================================================
@@ -91,21 +164,24 @@ async def get_me_route(user = Depends(get_current_user)):
 
 @app.post("/rooms", response_model=RoomOut)
 async def create_room_route(
-        user = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        user: CurrentUser,
+        db: DbSession
 ):
-    room = await create_room(db, user.id)
+    # Room + host membership go in as a single transaction
+    room = await create_room(db, user.id, commit=False)
 
     # NEW LINE: add the host to the room members automatically
-    await add_user_to_room(db, room.id, user.id)
+    await add_user_to_room(db, room.id, user.id, commit=False)
 
+    await db.commit()
+    await db.refresh(room)
     return room
 
 @app.post("/rooms/join/{code}")
 async def join_room_route(
         code: str,
-        user = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        user: CurrentUser,
+        db: DbSession
 ):
     room = await get_room_by_code(db, code)
     if not room:
@@ -122,8 +198,8 @@ async def join_room_route(
 async def save_preferences_route(
         room_id: int,
         prefs: PreferencesCreate,
-        user = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        user: CurrentUser,
+        db: DbSession
 ):
     saved = await save_preferences(db, room_id, user.id, prefs)
     return {"message": "Preferences saved", "id": saved.id}
@@ -131,55 +207,32 @@ async def save_preferences_route(
 @app.get("/rooms/{room_id}/preferences", response_model=List[PreferencesOut])
 async def get_room_preferences(
         room_id: int,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user),
+        db: DbSession,
+        current_user: CurrentUser,
 ):
-    result = await db.execute(
-        select(PreferenceProfile).where(PreferenceProfile.room_id == room_id)
-    )
-    prefs = result.scalars().all()
-
-    return [
-        PreferencesOut(
-            id=p.id,
-            user_id=p.user_id,
-            room_id=p.room_id,
-            genres=safe_json_load(p.genres, []),
-            hard_nos=safe_json_load(p.hard_nos, []),
-            energy_level=p.energy_level,
-            new_vs_familiar=p.new_vs_familiar,
-            event_type=p.event_type,
-            created_at=p.created_at
-        )
-        for p in prefs
-    ]
+    prefs = await get_preferences_for_room(db, room_id)
+
+    # PreferencesOut reads ORM attributes (orm_mode), so let the response_model
+    # validate the rows once instead of building each model by hand first
+    return prefs
 
 
 @app.get("/rooms/{room_id}/preferences/me")
 async def check_my_preferences(
         room_id: int,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: DbSession,
+        current_user: CurrentUser
 ):
-    result = await db.execute(
-        select(PreferenceProfile).where(
-            PreferenceProfile.room_id == room_id,
-            PreferenceProfile.user_id == current_user.id
-        )
-    )
-    pref = result.scalars().first()
-    return {"completed": pref is not None}
+    completed = await has_preferences(db, room_id, current_user.id)
+    return {"completed": completed}
 
 @app.get("/rooms/{room_id}/vibe-profile", response_model=VibeProfile)
 async def get_vibe_profile(
         room_id: int,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: DbSession,
+        current_user: CurrentUser
 ):
-    result = await db.execute(
-        select(PreferenceProfile).where(PreferenceProfile.room_id == room_id)
-    )
-    prefs = result.scalars().all()
+    prefs = await get_preferences_for_room(db, room_id)
 
     if not prefs:
         raise HTTPException(status_code=400, detail="No preferences found.")
@@ -192,8 +245,8 @@ async def get_vibe_profile(
 @app.delete("/rooms/{room_id}")
 async def end_room_route(
         room_id: int,
-        user = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        user: CurrentUser,
+        db: DbSession
 ):
     room, error = await end_room(db, room_id, user.id)
 
@@ -208,8 +261,8 @@ async def end_room_route(
 @app.get("/rooms/{room_id}", response_model=RoomOut)
 async def get_room_details(
         room_id: int,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: DbSession,
+        current_user: CurrentUser
 ):
     room = await get_room(db, room_id)
 
@@ -221,8 +274,8 @@ async def get_room_details(
 @app.delete("/rooms/{room_id}/leave")
 async def leave_room_route(
         room_id: int,
-        user = Depends(get_current_user),
-        db: AsyncSession = Depends(get_db)
+        user: CurrentUser,
+        db: DbSession
 ):
     success = await remove_user_from_room(db, room_id, user.id)
 
@@ -232,25 +285,20 @@ async def leave_room_route(
     return {"message": "Left room"}
 
 
-@app.get("/rooms/{room_id}/members")
+@app.get("/rooms/{room_id}/members", response_model=List[RoomMemberOut])
 async def get_members_route(
         room_id: int,
-        db: AsyncSession = Depends(get_db),
-        current_user: User = Depends(get_current_user)
+        db: DbSession,
+        current_user: CurrentUser
 ):
     members = await get_room_members(db, room_id)
     return members
 
-# backend/main.py
-
-from backend.rec_engine import generate_vibe_profile
-from backend.crud import get_preferences_for_room
-
 @app.get("/test/vibe-profile/{room_id}")
 async def test_vibe_profile(
         room_id: int,
-        user=Depends(get_current_user),
-        db: AsyncSession = Depends(get_db),
+        user: CurrentUser,
+        db: DbSession,
 ):
     prefs = await get_preferences_for_room(db, room_id)
 
@@ -264,41 +312,38 @@ async def test_vibe_profile(
         "vibe_profile": vibe_profile,
     }
 
-def safe_json_load(value, default):
-    if not value:
-        return default
-    if isinstance(value, (list, dict)):
-        return value
-    try:
-        return json.loads(value)
-    except json.JSONDecodeError:
-        return default
-
 @app.get("/test/playlist-engine-spotify/{room_id}")
 async def test_playlist_engine_spotify(
         room_id: int,
-        user=Depends(get_current_user),
-        db: AsyncSession = Depends(get_db),
+        user: CurrentUser,
+        db: DbSession,
+        http: HttpClient,
 ):
+    # Check preferences before spending any Spotify calls on a room that
+    # would 404 anyway
     prefs = await get_preferences_for_room(db, room_id)
     if not prefs:
         raise HTTPException(404, "No preferences found")
 
     vibe_profile = generate_vibe_profile(prefs)
-
-    access_token = await spotify_auth.get_valid_access_token(user)
+    access_token = await spotify_auth.get_valid_access_token(http, user)
 
     # 1) Get top tracks
-    tracks = await spotify_auth.get_top_tracks(access_token)
-    track_ids = [t["id"] for t in tracks if t.get("id")]
-    print("ABOUT TO CALL SPOTIFY /me")
-    profile = await spotify_auth.get_user_profile(access_token)
-    print("PROFILE:", profile)
-    track_ids = [t for t in track_ids if t][:50]
-    print("USING TRACK IDS:", track_ids)
-    # 2) Get audio features for those tracks
-    #audio_features = await spotify_auth.get_audio_features(access_token, track_ids)
-    print("first track audio feature", spotify_auth.get_audio_features(access_token, ["2mNGL7mZILSqZHxGboJaO9"]).get("genres"))
+    tracks = await spotify_auth.get_top_tracks(http, access_token)
+    track_ids = list(itertools.islice((t["id"] for t in tracks if t.get("id")), 50))
+    logger.debug("Using track ids: %s", track_ids)
+    # 2) Get profile and audio features concurrently (neither depends on the other)
+    #audio_features = await spotify_auth.get_audio_features(http, access_token, track_ids)
+    # TaskGroup cancels the other call if one fails
+    async with asyncio.TaskGroup() as tg:
+        profile_task = tg.create_task(spotify_auth.get_user_profile(http, access_token))
+        features_task = tg.create_task(
+            spotify_auth.get_audio_features(http, access_token, ["2mNGL7mZILSqZHxGboJaO9"])
+        )
+    profile = profile_task.result()
+    first_features = features_task.result()
+    logger.debug("Profile: %s", profile)
+    logger.debug("First track audio feature: %s", first_features[0].get("genres"))
     #features_by_id = {f["id"]: f for f in audio_features if f and f.get("id")}
 
     # 3) Build candidate_songs in the shape your engine expects
@@ -322,11 +367,3 @@ async def test_playlist_engine_spotify(
 
     #return ranked[:25]
     return "here"
-# ============================================================
-# CREATE TABLES ON STARTUP
-# ============================================================
-
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
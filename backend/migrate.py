@@ -0,0 +1,135 @@
+# backend/migrate.py
+#
+# One-off upgrade for databases created before the current schema: JSON list
+# preference columns, one preference row / membership per user per room, and
+# the indexes declared in models.py. create_all never alters existing tables,
+# so run this once against old databases:
+#
+#     python -m backend.migrate
+#
+# Safe to re-run.
+
+import asyncio
+import json
+
+from sqlalchemy import UniqueConstraint, inspect, text
+
+from .database import Base, engine
+from . import models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+def to_list(value) -> list[str]:
+    """Parse a stored genres / hard_nos value into a list.
+
+    Older rows hold either a JSON-encoded list (insert path) or a comma
+    separated string (update path).
+    """
+    if isinstance(value, list):
+        return value
+    if not value:
+        return []
+
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+
+    return [g for g in value.split(",") if g]
+
+
+def create_missing_indexes(conn) -> list[str]:
+    """Create any models.py index or unique constraint the database lacks.
+
+    Unique constraints are added as unique indexes of the same name, since
+    SQLite can't ALTER TABLE ... ADD CONSTRAINT.
+    """
+    inspector = inspect(conn)
+    created = []
+    for table in Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        existing.update(uc["name"] for uc in inspector.get_unique_constraints(table.name))
+
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+                created.append(index.name)
+
+        for constraint in table.constraints:
+            if not isinstance(constraint, UniqueConstraint) or not constraint.name:
+                continue
+            if constraint.name in existing:
+                continue
+            columns = ", ".join(c.name for c in constraint.columns)
+            conn.exec_driver_sql(
+                f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"
+            )
+            created.append(constraint.name)
+    return created
+
+
+async def migrate():
+    async with engine.begin() as conn:
+        postgres = conn.dialect.name == "postgresql"
+
+        # 1) Dedupe ahead of the unique indexes: keep the newest profile and
+        # the earliest membership per user per room
+        deleted = await conn.execute(text(
+            "DELETE FROM preferences WHERE id NOT IN ("
+            " SELECT MAX(id) FROM preferences GROUP BY room_id, user_id"
+            ")"
+        ))
+        print(f"Removed {deleted.rowcount} duplicate preference rows")
+
+        deleted = await conn.execute(text(
+            "DELETE FROM room_members WHERE id NOT IN ("
+            " SELECT MIN(id) FROM room_members GROUP BY room_id, user_id"
+            ")"
+        ))
+        print(f"Removed {deleted.rowcount} duplicate room memberships")
+
+        # 2) Rewrite CSV / JSON text as JSON arrays
+        rows = await conn.execute(text("SELECT id, genres, hard_nos FROM preferences"))
+        converted = 0
+        for pref_id, genres, hard_nos in rows.all():
+            new_genres = json.dumps(to_list(genres))
+            new_hard_nos = json.dumps(to_list(hard_nos))
+            # JSONB rows come back as lists and SQLite JSON rows as their
+            # text, so either way migrated rows are skipped
+            if isinstance(genres, list) and isinstance(hard_nos, list):
+                continue
+            if (genres, hard_nos) == (new_genres, new_hard_nos):
+                continue
+
+            await conn.execute(
+                text("UPDATE preferences SET genres = :genres, hard_nos = :hard_nos WHERE id = :id"),
+                {"id": pref_id, "genres": new_genres, "hard_nos": new_hard_nos},
+            )
+            converted += 1
+        print(f"Converted {converted} preference rows to JSON lists")
+
+        if postgres:
+            for column in ("genres", "hard_nos"):
+                await conn.execute(text(
+                    f"ALTER TABLE preferences"
+                    f" ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb,"
+                    f" ALTER COLUMN {column} SET DEFAULT '[]',"
+                    f" ALTER COLUMN {column} SET NOT NULL"
+                ))
+        # SQLite stores JSON as text and can't alter column constraints;
+        # every row now holds a JSON array, which is all the ORM needs
+
+        # 3) Every index and unique constraint declared in models.py
+        # (including ix_pref_room_user, the preferences upsert's conflict target)
+        created = await conn.run_sync(create_missing_indexes)
+        print(f"Created indexes: {', '.join(created) or 'none'}")
+
+        # Superseded by uq_member_room_user's leading room_id column
+        await conn.execute(text("DROP INDEX IF EXISTS ix_member_room"))
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
@@ -1,9 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import (
+    Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Index,
+    UniqueConstraint
+)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from .database import Base
 
+# Native JSON list column: JSONB on Postgres, JSON elsewhere (e.g. SQLite)
+JSONList = JSON().with_variant(JSONB(), "postgresql")
+
 
 # =====================
 # USERS TABLE
@@ -12,7 +19,7 @@ class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    spotify_id = Column(String, unique=True, nullable=False)
+    spotify_id = Column(String, unique=True, index=True, nullable=False)
     display_name = Column(String)
     avatar_url = Column(String)
     refresh_token = Column(String)
@@ -30,8 +37,8 @@ class Room(Base):
     __tablename__ = "rooms"
 
     id = Column(Integer, primary_key=True, index=True)
-    code = Column(String, unique=True, nullable=False)
-    host_user_id = Column(Integer, ForeignKey("users.id"))
+    code = Column(String, unique=True, index=True, nullable=False)
+    host_user_id = Column(Integer, ForeignKey("users.id"), index=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -47,15 +54,21 @@ class Room(Base):
 # =====================
 class RoomMember(Base):
     __tablename__ = "room_members"
+    __table_args__ = (
+        # One membership per user per room; its room_id prefix also serves
+        # "members of room X" lookups, so room_id needs no index of its own
+        UniqueConstraint("room_id", "user_id", name="uq_member_room_user"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     room_id = Column(Integer, ForeignKey("rooms.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     joined_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     room = relationship("Room", back_populates="members")
-    user = relationship("User", back_populates="room_memberships")
+    # lazy="raise" so a missing selectinload fails loudly instead of N+1-ing
+    user = relationship("User", back_populates="room_memberships", lazy="raise")
 
 
 # =====================
@@ -63,21 +76,27 @@ class RoomMember(Base):
 # =====================
 class PreferenceProfile(Base):
     __tablename__ = "preferences"
+    __table_args__ = (
+        # One profile per user per room; also the conflict target for upserts
+        Index("ix_pref_room_user", "room_id", "user_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
+    # room_id lookups use ix_pref_room_user's leading column
     room_id = Column(Integer, ForeignKey("rooms.id"))
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     event_type = Column(String)
-    genres = Column(Text)  # store JSON-encoded list
+    genres = Column(JSONList, nullable=False, server_default="[]")
     energy_level = Column(Integer)
     new_vs_familiar = Column(String)
-    hard_nos = Column(Text)
+    hard_nos = Column(JSONList, nullable=False, server_default="[]")
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     room = relationship("Room", back_populates="preferences")
-    user = relationship("User")
+    # Nothing reads preference.user yet; raise rather than lazy-load per row
+    user = relationship("User", lazy="raise")
 
 
 # =====================
@@ -87,7 +106,7 @@ class Playlist(Base):
     __tablename__ = "playlists"
 
     id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"))
+    room_id = Column(Integer, ForeignKey("rooms.id"), index=True)
     spotify_playlist_id = Column(String, nullable=False)
     url = Column(String)
     track_count = Column(Integer)
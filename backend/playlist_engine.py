@@ -1,4 +1,52 @@
-from typing import List, Dict, Any, Tuple
+import heapq
+from dataclasses import dataclass, field
+from operator import itemgetter
+from types import MappingProxyType
+from typing import List, Dict, Any, Mapping, Sequence, Tuple
+
+DEFAULT_MAX_LENGTH = 50
+DEFAULT_MAX_PER_ARTIST = 2
+
+# How many ranked songs to pull per playlist slot before falling back to a
+# full sort; leaves slack for duplicate / artist-cap rejections
+RANK_OVERSAMPLE = 3
+
+
+@dataclass(frozen=True, slots=True)
+class NormalizedVibe:
+    """A room vibe profile after normalize_vibe_profile.
+
+    Build it once per room and pass it to generate_playlist repeatedly to
+    skip re-normalizing the vibe on every call.
+    """
+    target_genres: Tuple[str, ...]
+    energy: float
+    new_vs_familiar: float
+    hard_no_genres: Tuple[str, ...]
+    event_type: str | None
+    # Read-only view so the frozen instance really is immutable; left out of
+    # hash/eq since the masks below already encode it
+    genre_index: Mapping[str, int] = field(hash=False, compare=False)
+    target_mask: int
+    hard_no_mask: int
+    # Scoring terms that only depend on the vibe
+    genre_denom: int
+    prefer_new: bool
+
+
+@dataclass(slots=True)
+class Song:
+    """A candidate song reduced to the fields the engine scores on.
+
+    genre_mask is only meaningful against the vibe it was built for, so
+    generate_playlist hands back `source`, the caller's song dict.
+    """
+    id: str
+    genre_mask: int
+    energy: float
+    popularity: int
+    artist: str | None
+    source: Dict[str, Any] = field(repr=False, compare=False)
 
 
 # ---------------------------
@@ -6,7 +54,7 @@ from typing import List, Dict, Any, Tuple
 # ---------------------------
 
 def generate_playlist(
-        room_vibe_profile: Dict[str, Any],
+        room_vibe_profile: Dict[str, Any] | NormalizedVibe,
         candidate_songs: List[Dict[str, Any]],
         room_settings: Dict[str, Any] | None = None
 ) -> List[Dict[str, Any]]:
@@ -15,14 +63,17 @@ def generate_playlist(
         return []
 
     # Normalize inputs
-    vibe = normalize_vibe_profile(room_vibe_profile)
-    songs = normalize_songs(candidate_songs)
+    if isinstance(room_vibe_profile, NormalizedVibe):
+        vibe = room_vibe_profile
+    else:
+        vibe = normalize_vibe_profile(room_vibe_profile)
+    songs = normalize_songs(candidate_songs, vibe.genre_index)
 
     # Filter hard-no genres
-    hard_nos = set(vibe["hard_no_genres"])
+    hard_mask = vibe.hard_no_mask
     songs = [
         s for s in songs
-        if not hard_nos.intersection(s["genres"])
+        if not s.genre_mask & hard_mask
     ]
 
     if not songs:
@@ -31,54 +82,87 @@ def generate_playlist(
     # Score songs
     scored = score_songs(vibe, songs)
 
-    # Rank songs
-    ranked = rank_songs(scored)
+    # Rank only the top slice we're likely to need (O(N log K), not O(N log N))
+    max_length, _ = playlist_limits(room_settings)
+    ranked = rank_songs(scored, limit=max(1, max_length) * RANK_OVERSAMPLE)
 
     # Apply constraints
     final_playlist = apply_constraints(ranked, room_settings)
 
-    return final_playlist
+    # Constraints rejected too much of the slice; use the full ranking
+    if len(final_playlist) < max_length and len(ranked) < len(scored):
+        final_playlist = apply_constraints(rank_songs(scored), room_settings)
+
+    return [song.source for song in final_playlist]
 
 
 # ---------------------------
 # Vibe handling
 # ---------------------------
 
-def normalize_vibe_profile(vibe: Dict[str, Any]) -> Dict[str, Any]:
-    return {
-        "target_genres": [g.lower() for g in vibe.get("target_genres", [])],
-        "energy": clamp(vibe.get("energy", 0.5)),
-        "new_vs_familiar": clamp(vibe.get("new_vs_familiar", 0.5)),
-        "hard_no_genres": [g.lower() for g in vibe.get("hard_no_genres", [])],
-        "event_type": vibe.get("event_type")
-    }
+def normalize_vibe_profile(vibe: Dict[str, Any]) -> NormalizedVibe:
+    target_genres = tuple(g.lower() for g in vibe.get("target_genres", []))
+    hard_no_genres = tuple(g.lower() for g in vibe.get("hard_no_genres", []))
+    new_vs_familiar = clamp(vibe.get("new_vs_familiar", 0.5))
+
+    # One bit per genre the vibe cares about; songs carry a matching mask so
+    # genre matching and hard-no filtering are a single integer AND
+    genre_index = build_genre_index(target_genres + hard_no_genres)
+
+    return NormalizedVibe(
+        target_genres=target_genres,
+        energy=clamp(vibe.get("energy", 0.5)),
+        new_vs_familiar=new_vs_familiar,
+        hard_no_genres=hard_no_genres,
+        event_type=vibe.get("event_type"),
+        genre_index=MappingProxyType(genre_index),
+        target_mask=genre_mask(target_genres, genre_index),
+        hard_no_mask=genre_mask(hard_no_genres, genre_index),
+        genre_denom=max(1, len(target_genres)),
+        prefer_new=new_vs_familiar > 0.5,
+    )
+
+
+def build_genre_index(genres: Tuple[str, ...]) -> Dict[str, int]:
+    return {g: 1 << i for i, g in enumerate(dict.fromkeys(genres))}
+
+
+def genre_mask(genres: Sequence[str], genre_index: Mapping[str, int]) -> int:
+    mask = 0
+    for g in genres:
+        mask |= genre_index.get(g, 0)
+    return mask
 
 
 # ---------------------------
 # Song preparation
 # ---------------------------
 
-def normalize_songs(songs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    normalized = []
-
-    for s in songs:
-        song_id = s.get("id") or s.get("uri")
-        if not song_id:
-            continue
+def normalize_songs(
+        songs: List[Dict[str, Any]],
+        genre_index: Mapping[str, int]
+) -> List[Song]:
+    # Songs without an id or uri are skipped
+    return [
+        Song(
+            id=song_id,
+            genre_mask=genre_mask(song_genres(s), genre_index),
+            energy=clamp(s.get("energy", 0.5)),
+            popularity=s.get("popularity", 50),
+            artist=s.get("artist"),
+            source=s,
+        )
+        for s in songs
+        if (song_id := s.get("id") or s.get("uri"))
+    ]
 
-        genres = s.get("genres", [])
-        if isinstance(genres, str):
-            genres = [genres]
 
-        normalized.append({
-            "id": song_id,
-            "genres": [g.lower() for g in genres],
-            "energy": clamp(s.get("energy", 0.5)),
-            "popularity": s.get("popularity", 50),
-            "artist": s.get("artist")
-        })
+def song_genres(song: Dict[str, Any]) -> List[str]:
+    genres = song.get("genres", [])
+    if isinstance(genres, str):
+        genres = [genres]
 
-    return normalized
+    return [g.lower() for g in genres]
 
 
 # ---------------------------
@@ -86,39 +170,26 @@ def normalize_songs(songs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 # ---------------------------
 
 def score_songs(
-        vibe: Dict[str, Any],
-        songs: List[Dict[str, Any]]
-) -> List[Tuple[Dict[str, Any], float]]:
-
-    scored = []
-
-    for song in songs:
-        score = compute_similarity_score(vibe, song)
-        scored.append((song, score))
-
-    return scored
+        vibe: NormalizedVibe,
+        songs: List[Song]
+) -> List[Tuple[Song, float]]:
+    return [(song, compute_similarity_score(vibe, song)) for song in songs]
 
 
 def compute_similarity_score(
-        vibe: Dict[str, Any],
-        song: Dict[str, Any]
+        vibe: NormalizedVibe,
+        song: Song
 ) -> float:
-    # Genre score
-    genre_matches = len(
-        set(song["genres"]).intersection(vibe["target_genres"])
-    )
-    genre_score = genre_matches / max(1, len(vibe["target_genres"]))
+    # Genre score (songs must come from normalize_songs with this vibe's index)
+    genre_matches = (song.genre_mask & vibe.target_mask).bit_count()
+    genre_score = genre_matches / vibe.genre_denom
 
     # Energy score (closer is better)
-    energy_score = 1 - abs(song["energy"] - vibe["energy"])
+    energy_score = 1 - abs(song.energy - vibe.energy)
 
     # Familiarity proxy (using popularity)
-    popularity_norm = clamp(song["popularity"] / 100)
-    familiarity_score = (
-        1 - popularity_norm
-        if vibe["new_vs_familiar"] > 0.5
-        else popularity_norm
-    )
+    popularity_norm = clamp(song.popularity / 100)
+    familiarity_score = 1 - popularity_norm if vibe.prefer_new else popularity_norm
 
     # Final weighted score
     return (
@@ -133,39 +204,50 @@ def compute_similarity_score(
 # ---------------------------
 
 def rank_songs(
-        scored_songs: List[Tuple[Dict[str, Any], float]]
-) -> List[Dict[str, Any]]:
-    scored_songs.sort(key=lambda x: x[1], reverse=True)
-    return [s for s, _ in scored_songs]
-
+        scored_songs: List[Tuple[Song, float]],
+        limit: int | None = None
+) -> List[Song]:
+    # nlargest matches sorted(..., reverse=True)[:limit], ties included
+    if limit is not None and limit < len(scored_songs):
+        top = heapq.nlargest(limit, scored_songs, key=itemgetter(1))
+    else:
+        top = sorted(scored_songs, key=itemgetter(1), reverse=True)
+    return [s for s, _ in top]
 
-def apply_constraints(
-        ranked_songs: List[Dict[str, Any]],
-        room_settings: Dict[str, Any] | None
-) -> List[Dict[str, Any]]:
 
-    max_length = 50
-    max_per_artist = 2
+def playlist_limits(room_settings: Dict[str, Any] | None) -> Tuple[int, int]:
+    max_length = DEFAULT_MAX_LENGTH
+    max_per_artist = DEFAULT_MAX_PER_ARTIST
 
     if room_settings:
         max_length = room_settings.get("max_length", max_length)
         max_per_artist = room_settings.get("max_per_artist", max_per_artist)
 
+    return max_length, max_per_artist
+
+
+def apply_constraints(
+        ranked_songs: List[Song],
+        room_settings: Dict[str, Any] | None
+) -> List[Song]:
+
+    max_length, max_per_artist = playlist_limits(room_settings)
+
     seen = set()
     artist_counts = {}
     final = []
 
     for song in ranked_songs:
-        if song["id"] in seen:
+        if song.id in seen:
             continue
 
-        artist = song.get("artist")
+        artist = song.artist
         if artist:
             artist_counts[artist] = artist_counts.get(artist, 0) + 1
             if artist_counts[artist] > max_per_artist:
                 continue
 
-        seen.add(song["id"])
+        seen.add(song.id)
         final.append(song)
 
         if len(final) >= max_length:
@@ -1,4 +1,3 @@
-import json
 from collections import Counter
 
 
@@ -13,30 +12,27 @@ def generate_vibe_profile(preferences):
     if not preferences:
         return None
 
-    all_genres = []
+    # Single pass: counters and running sums instead of per-field lists
+    genre_counts = Counter()
+    event_type_counts = Counter()
     all_hard_nos = set()
-    energy_values = []
-    new_vs_familiar_values = []
-    event_types = []
+    energy_sum = 0
+    new_vs_familiar_sum = 0
+    n = 0
 
     for p in preferences:
-        # Parse JSON fields
-        genres = json.loads(p.genres) if p.genres else []
-        hard_nos = json.loads(p.hard_nos) if p.hard_nos else []
+        # JSON columns already come back as Python lists
+        genre_counts.update(p.genres or [])
+        all_hard_nos.update(p.hard_nos or [])
 
-        all_genres.extend(genres)
-        all_hard_nos.update(hard_nos)
-
-        energy_values.append(p.energy_level)
-        event_types.append(p.event_type)
+        energy_sum += p.energy_level
+        event_type_counts[p.event_type] += 1
 
         # Convert string → numeric
-        new_vs_familiar_values.append(
-            NEW_VS_FAMILIAR_MAP.get(p.new_vs_familiar, 0.5)
-        )
+        new_vs_familiar_sum += NEW_VS_FAMILIAR_MAP.get(p.new_vs_familiar, 0.5)
+        n += 1
 
     # Remove hard-no genres globally
-    genre_counts = Counter(all_genres)
     for g in all_hard_nos:
         genre_counts.pop(g, None)
 
@@ -44,10 +40,8 @@ def generate_vibe_profile(preferences):
 
     return {
         "target_genres": target_genres,
-        "energy": round((sum(energy_values) / len(energy_values)) / 10, 2),
-        "new_vs_familiar": round(
-            sum(new_vs_familiar_values) / len(new_vs_familiar_values), 2
-        ),
+        "energy": round((energy_sum / n) / 10, 2),
+        "new_vs_familiar": round(new_vs_familiar_sum / n, 2),
         "hard_no_genres": list(all_hard_nos),
-        "event_type": Counter(event_types).most_common(1)[0][0]
+        "event_type": event_type_counts.most_common(1)[0][0]
     }
@@ -0,0 +1,96 @@
+# backend/response_cache.py
+
+import hashlib
+import time
+
+from .auth import token_expiry
+
+
+class ResponseCacheMiddleware:
+    """Serve repeat GETs of whitelisted paths from memory.
+
+    Plain ASGI (not BaseHTTPMiddleware) so uncached routes pass straight
+    through. Entries are keyed by path + query + Authorization header, so
+    each token only ever sees its own cached responses, and no entry
+    outlives its bearer token's exp claim.
+
+    A hit skips the route's dependencies, so a user deleted within the ttl
+    keeps getting their cached response until the entry expires.
+    """
+
+    def __init__(self, app, paths, ttl: float = 15, max_entries: int = 5000):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, status, headers, body)
+        self._cache: dict[bytes, tuple[float, int, list, bytes]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or scope["path"] not in self.paths
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        auth = next((v for k, v in scope["headers"] if k == b"authorization"), b"")
+        # A 200 means the route already verified this token
+        scheme, _, raw_token = auth.decode("latin-1").partition(" ")
+        key = hashlib.sha256(
+            b"\0".join((scope["path"].encode(), scope["query_string"], auth))
+        ).digest()
+
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            _, status, headers, body = cached
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        start = {}
+        chunks = []
+
+        async def send_and_capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                # Only successful responses are cached
+                if not message.get("more_body") and start.get("status") == 200:
+                    self._store(
+                        key,
+                        self._lifetime(scheme, raw_token),
+                        start["status"],
+                        start.get("headers", []),
+                        b"".join(chunks),
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
+
+    def _lifetime(self, scheme: str, raw_token: str) -> float:
+        """Seconds an entry may live: the ttl, capped at the token's exp."""
+        if scheme.lower() != "bearer":
+            return self.ttl
+
+        exp = token_expiry(raw_token)
+        if exp is None:
+            return 0
+        return min(self.ttl, exp - time.time())
+
+    def _store(
+            self,
+            key: bytes,
+            lifetime: float,
+            status: int,
+            headers: list,
+            body: bytes
+    ) -> None:
+        self._cache.pop(key, None)
+        if lifetime <= 0:
+            return
+        if len(self._cache) >= self.max_entries:
+            self._cache.pop(next(iter(self._cache)))
+        self._cache[key] = (time.monotonic() + lifetime, status, list(headers), body)
@@ -68,6 +68,7 @@ class RoomMemberOut(BaseModel):
     room_id: int
     user_id: int
     joined_at: datetime
+    user: Optional[UserBase] = None
 
     class Config:
         orm_mode = True
@@ -1,17 +1,39 @@
 import os
 import base64
+import asyncio
+import itertools
 import httpx
+import orjson
 from urllib.parse import urlencode
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Settings for the app-wide AsyncClient (created in main.lifespan) so every
+# Spotify call reuses pooled keep-alive connections instead of a new TLS handshake
+HTTP_TIMEOUT = 10.0
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+
+# Spotify's /audio-features accepts at most this many ids per request
+AUDIO_FEATURES_BATCH = 100
+
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 SPOTIFY_REDIRECT_URI = os.getenv("SPOTIFY_REDIRECT_URI")
 SPOTIFY_SCOPES = os.getenv("SPOTIFY_SCOPES")
 
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+# Client credentials go in a Basic auth header (never the form body);
+# encoded once since they don't change at runtime
+TOKEN_HEADERS = {
+    "Authorization": "Basic " + base64.b64encode(
+        f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()
+    ).decode(),
+    "Content-Type": "application/x-www-form-urlencoded",
+}
+
 # For your own app JWT
 from .auth import create_app_token
 
@@ -34,69 +56,48 @@ def build_auth_url():
 # STEP 2 — Exchange Authorization Code for Access Token
 # ----------------------------------------------------------
 
-async def exchange_code_for_token(code: str):
-    token_url = "https://accounts.spotify.com/api/token"
+async def request_token(client: httpx.AsyncClient, data: dict):
+    res = await client.post(SPOTIFY_TOKEN_URL, headers=TOKEN_HEADERS, data=data)
+    return orjson.loads(res.content)
 
-    basic_auth = base64.b64encode(
-        f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()
-    ).decode()
-
-    headers = {
-        "Authorization": f"Basic {basic_auth}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
 
+async def exchange_code_for_token(client: httpx.AsyncClient, code: str):
     data = {
         "grant_type": "authorization_code",
         "code": code,
         "redirect_uri": SPOTIFY_REDIRECT_URI,
     }
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(token_url, headers=headers, data=data)
-        return res.json()
+    return await request_token(client, data)
 
 
 # ----------------------------------------------------------
 # STEP 3 — Refresh token (used later)
 # ----------------------------------------------------------
 
-async def refresh_access_token(refresh_token: str):
-    token_url = "https://accounts.spotify.com/api/token"
-
-    basic_auth = base64.b64encode(
-        f"{SPOTIFY_CLIENT_ID}:{SPOTIFY_CLIENT_SECRET}".encode()
-    ).decode()
-
-    headers = {
-        "Authorization": f"Basic {basic_auth}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-
+async def refresh_access_token(client: httpx.AsyncClient, refresh_token: str):
     data = {
         "grant_type": "refresh_token",
         "refresh_token": refresh_token,
     }
 
-    async with httpx.AsyncClient() as client:
-        res = await client.post(token_url, headers=headers, data=data)
-        return res.json()
+    return await request_token(client, data)
 
 
 # ----------------------------------------------------------
 # STEP 4 — Get Spotify Profile using Access Token
 # ----------------------------------------------------------
 
-async def get_user_profile(access_token: str):
+async def get_user_profile(client: httpx.AsyncClient, access_token: str):
     url = "https://api.spotify.com/v1/me"
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with httpx.AsyncClient() as client:
-        res = await client.get(url, headers=headers)
-        return res.json()
+    res = await client.get(url, headers=headers)
+    res.raise_for_status()
+    return orjson.loads(res.content)
 
-async def get_valid_access_token(user):
-    token_data = await refresh_access_token(user.refresh_token)
+async def get_valid_access_token(client: httpx.AsyncClient, user):
+    token_data = await refresh_access_token(client, user.refresh_token)
 
     if "access_token" not in token_data:
         raise Exception(f"Spotify token refresh failed: {token_data}")
@@ -104,28 +105,31 @@ async def get_valid_access_token(user):
     return token_data["access_token"]
 
 
-async def get_top_tracks(access_token: str, limit: int = 50):
+async def get_top_tracks(client: httpx.AsyncClient, access_token: str, limit: int = 50):
     url = "https://api.spotify.com/v1/me/top/tracks"
     headers = {"Authorization": f"Bearer {access_token}"}
     params = {"limit": limit, "time_range": "medium_term"}
 
-    async with httpx.AsyncClient() as client:
-        res = await client.get(url, headers=headers, params=params)
-        return res.json()["items"]
+    res = await client.get(url, headers=headers, params=params)
+    res.raise_for_status()
+    return orjson.loads(res.content)["items"]
 
-async def get_audio_features(access_token: str, track_ids: list[str]):
+async def get_audio_features(
+        client: httpx.AsyncClient,
+        access_token: str,
+        track_ids: list[str]
+):
     url = "https://api.spotify.com/v1/audio-features"
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    params = {
-        "ids": ",".join(track_ids[:1])  # max 100
-    }
-
-    async with httpx.AsyncClient() as client:
-        res = await client.get(url, headers=headers, params=params)
-        data = res.json()
-
-    if "audio_features" not in data:
-        raise Exception(f"Spotify audio-features error: {data}")
-
-    return data["audio_features"]
+    async def fetch_batch(batch: list[str]):
+        res = await client.get(url, headers=headers, params={"ids": ",".join(batch)})
+        res.raise_for_status()
+        return orjson.loads(res.content)["audio_features"]
+
+    # Full batches of ids, fetched concurrently over the pooled client
+    batches = await asyncio.gather(*(
+        fetch_batch(track_ids[i:i + AUDIO_FEATURES_BATCH])
+        for i in range(0, len(track_ids), AUDIO_FEATURES_BATCH)
+    ))
+    return list(itertools.chain.from_iterable(batches))
@@ -0,0 +1,26 @@
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+# backend.database reads DATABASE_URL at import time
+_DB_DIR = tempfile.mkdtemp(prefix="viberoom-tests-")
+os.environ.setdefault(
+    "DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+)
+
+from backend.database import Base, engine  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_db():
+    """Recreate every table before each test."""
+    async def reset():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        await engine.dispose()
+
+    asyncio.run(reset())
+    yield
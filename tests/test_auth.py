@@ -0,0 +1,31 @@
+import time
+
+import jwt
+import pytest
+
+from backend import auth
+
+
+def signed(payload):
+    return jwt.encode(payload, auth._SECRET, algorithm=auth.ALGORITHM)
+
+
+@pytest.mark.parametrize("payload", [
+    {"sub": "1", "exp": "tomorrow"},
+    {"sub": "1", "exp": [1]},
+    {"sub": "not-a-user-id", "exp": int(time.time()) + 60},
+])
+def test_malformed_claims_are_invalid_tokens(payload):
+    with pytest.raises(jwt.InvalidTokenError):
+        auth._decode_cached(signed(payload), auth._token_key(signed(payload)))
+
+
+def test_token_expiry_rejects_malformed_exp():
+    assert auth.token_expiry(signed({"sub": "1", "exp": "tomorrow"})) is None
+
+
+def test_token_expiry_reads_exp():
+    token = auth.create_app_token(1)
+    assert auth.token_expiry(token) == jwt.decode(
+        token, options={"verify_signature": False}
+    )["exp"]
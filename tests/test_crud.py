@@ -0,0 +1,50 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from backend import crud
+from backend.database import AsyncSessionLocal, engine
+from backend.models import Room
+
+
+def run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(wrapper())
+
+
+async def count_rooms(db):
+    return (await db.execute(select(func.count()).select_from(Room))).scalar_one()
+
+
+def test_create_room_without_commit_rolls_back():
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            room = await crud.create_room(db, host_user_id=1, commit=False)
+            assert room.id is not None
+            await db.rollback()
+
+        async with AsyncSessionLocal() as db:
+            return await count_rooms(db)
+
+    assert run(scenario()) == 0
+
+
+def test_create_room_retries_code_collision(monkeypatch):
+    codes = iter(["AAAAAA", "AAAAAA", "BBBBBB"])
+    monkeypatch.setattr(crud, "generate_room_code", lambda: next(codes))
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            first = await crud.create_room(db, host_user_id=1)
+            second = await crud.create_room(db, host_user_id=1, commit=False)
+            await db.commit()
+
+        async with AsyncSessionLocal() as db:
+            return first.code, second.code, await count_rooms(db)
+
+    assert run(scenario()) == ("AAAAAA", "BBBBBB", 2)